@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 import os
+import re
 import uuid
 import pty
-import select
+import shlex
 import subprocess
 import asyncio
 import logging
@@ -12,7 +13,9 @@ import fcntl
 import struct
 import signal
 import argparse
+from collections import deque
 
+import orjson
 from aiohttp import web
 
 # Parse command-line arguments for debug flag
@@ -21,6 +24,11 @@ def parse_args():
     parser.add_argument(
         '--debug', action='store_true', help='Enable debug logging (INFO & DEBUG levels)'
     )
+    parser.add_argument(
+        '--control-mode', action='store_true',
+        help='Multiplex all sessions over one tmux control-mode client '
+             'instead of one PTY + tmux client per session'
+    )
     return parser.parse_args()
 
 # Only parse args when running as script
@@ -60,34 +68,137 @@ def setup_jupyter_server_proxy():
 
 SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Environment handed to tmux; built once instead of copied per spawn
+_TMUX_ENV = {**os.environ, 'TERM': 'xterm-256color'}
+
+# How long a /terminal/output long-poll waits for data before returning empty
+POLL_WAIT_S = 25.0
+
+# Coalesce PTY output: flush once a frame's worth of payload is buffered,
+# or after a short delay, so bursts of tiny writes share one send.
+CHUNK_FLUSH_BYTES = 1460
+CHUNK_FLUSH_MS = 10
+
+# Debounce resize requests: drag-resizing a browser window fires dozens
+# per second, and only the final geometry matters.
+RESIZE_DEBOUNCE_MS = 30
+
+
+def _json_response(payload):
+    """web.json_response, but encoded with orjson instead of stdlib json."""
+    return web.Response(body=orjson.dumps(payload),
+                        content_type='application/json')
+
 
 class TerminalSession:
     """One PTY + one headless tmux server + one tmux client per session_id."""
     def __init__(self, session_name, rows=24, cols=80):
         self.session_name = session_name
+        self.closed = False
         self.master, self.slave = pty.openpty()
         self._set_pty_size(rows, cols)
 
-        # Detached tmux server
-        subprocess.run(
-            ['tmux', 'new-session', '-d', '-s', session_name],
-            env=dict(os.environ, TERM='xterm-256color'),
-            check=False
-        )
-
-        # Attach client to that session on our PTY
+        # Attach-or-create the tmux session on our PTY in one spawn
         self.process = subprocess.Popen(
-            ['tmux', 'attach-session', '-t', session_name],
+            ['tmux', 'new-session', '-A', '-s', session_name],
             stdin=self.slave,
             stdout=self.slave,
             stderr=self.slave,
             start_new_session=True,
-            env=dict(os.environ, TERM='xterm-256color')
+            env=_TMUX_ENV
         )
 
+        # Process group never changes after start_new_session, so look
+        # it up once instead of on every resize
+        self.pgid = os.getpgid(self.process.pid)
+
         # Put the master side into raw mode
         tty.setraw(self.master)
 
+        # Event-driven reads: the loop wakes us exactly when the master
+        # is readable instead of handlers busy-polling with select().
+        # io_uring batched reads were evaluated for the many-session
+        # case, but one epoll-registered fd per session drains the PTY
+        # in a single large read per wakeup, so the extra dependency
+        # did not pay for itself; --control-mode already collapses all
+        # sessions onto one fd where fan-in cost matters.
+        os.set_blocking(self.master, False)
+        self.buffer = bytearray()
+        self.data_event = asyncio.Event()
+        self._flush_handle = None
+        self._pending_size = None
+        self._resize_handle = None
+        self._loop = asyncio.get_event_loop()
+        self._loop.add_reader(self.master, self._on_readable)
+
+        # Child-exit detection without a waitpid per poll: a pidfd
+        # becomes readable exactly once, when the tmux client exits
+        # (Linux >= 5.3; fall back to process.poll() otherwise)
+        self._exited = False
+        self.pidfd = None
+        if hasattr(os, 'pidfd_open'):
+            try:
+                self.pidfd = os.pidfd_open(self.process.pid)
+                self._loop.add_reader(self.pidfd, self._on_child_exit)
+            except OSError:
+                self.pidfd = None
+
+    def _on_child_exit(self):
+        self._loop.remove_reader(self.pidfd)
+        self.process.poll()  # reap the zombie
+        self._exited = True
+        self._flush()
+
+    def _on_readable(self):
+        # Drain everything available in large reads until the kernel
+        # says it would block, rather than one read per loop wakeup.
+        got_data = False
+        while True:
+            try:
+                chunk = os.read(self.master, 1 << 20)
+            except BlockingIOError:
+                break
+            except OSError:
+                # EIO: tmux client hung up; flush so consumers notice
+                # the process has exited.
+                chunk = b''
+            if not chunk:
+                self._flush()
+                return
+            self.buffer += chunk
+            got_data = True
+        if not got_data:
+            return
+        if len(self.buffer) >= CHUNK_FLUSH_BYTES:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                CHUNK_FLUSH_MS / 1000, self._flush
+            )
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.data_event.set()
+
+    def drain(self):
+        """Take everything buffered so far and reset the data event."""
+        # Swap rather than copy: consumers get the filled bytearray and
+        # the reader keeps appending into a fresh one
+        data = self.buffer
+        self.buffer = bytearray()
+        self.data_event.clear()
+        return data
+
+    def write_input(self, data):
+        os.write(self.master, data)
+
+    def exited(self):
+        if self.pidfd is not None:
+            return self._exited
+        return self.process.poll() is not None
+
     def _set_pty_size(self, rows, cols):
         winsize = struct.pack("HHHH", rows, cols, 0, 0)
         try:
@@ -96,14 +207,46 @@ class TerminalSession:
             logger.error(f"PTY ioctl resize failed: {e}")
 
     def resize(self, rows, cols):
+        """Record the newest size; the debounce timer applies the final one."""
+        self._pending_size = (rows, cols)
+        if self._resize_handle is None:
+            self._resize_handle = self._loop.call_later(
+                RESIZE_DEBOUNCE_MS / 1000, self._apply_pending_size
+            )
+
+    def _apply_pending_size(self):
+        self._resize_handle = None
+        rows, cols = self._pending_size
         self._set_pty_size(rows, cols)
         try:
-            pgid = os.getpgid(self.process.pid)
-            os.killpg(pgid, signal.SIGWINCH)
+            os.killpg(self.pgid, signal.SIGWINCH)
         except Exception as e:
-            logger.error(f"Failed to send SIGWINCH to tmux client (pgid={pgid}): {e}")
+            logger.error(f"Failed to send SIGWINCH to tmux client (pgid={self.pgid}): {e}")
 
     def close(self):
+        # Flag first so handlers awaiting between lookup and use see it
+        self.closed = True
+        try:
+            self._loop.remove_reader(self.master)
+        except Exception:
+            pass
+        if self.pidfd is not None:
+            if not self._exited:
+                try:
+                    self._loop.remove_reader(self.pidfd)
+                except Exception:
+                    pass
+            try:
+                os.close(self.pidfd)
+            except OSError:
+                pass
+            self.pidfd = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._resize_handle is not None:
+            self._resize_handle.cancel()
+            self._resize_handle = None
         try:
             self.process.terminate()
             self.process.wait(timeout=1)
@@ -112,15 +255,233 @@ class TerminalSession:
         subprocess.run(['tmux', 'kill-session', '-t', self.session_name], check=False)
 
 
+# tmux control mode escapes non-printable %output bytes as \ooo
+_OCTAL_ESCAPE_RE = re.compile(rb'\\([0-7]{3})')
+
+
+def _unescape_output(data):
+    return _OCTAL_ESCAPE_RE.sub(lambda m: bytes([int(m.group(1), 8)]), data)
+
+
+class ControlModeSession:
+    """Drop-in for TerminalSession backed by a window in the shared hub.
+
+    No PTY pair and no tmux client process of its own: the hub feeds us
+    the bytes tmux frames as %output notifications for our pane.
+    """
+    def __init__(self, hub, session_name, window_id, pane_id):
+        self.session_name = session_name
+        self.closed = False
+        self.hub = hub
+        self.window_id = window_id
+        self.pane_id = pane_id
+        self.buffer = bytearray()
+        self.data_event = asyncio.Event()
+        self._flush_handle = None
+        self._pending_size = None
+        self._resize_handle = None
+        self._exited = False
+        self._loop = asyncio.get_event_loop()
+
+    def feed(self, data):
+        """Called by the hub with unescaped %output bytes for our pane."""
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_FLUSH_BYTES:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                CHUNK_FLUSH_MS / 1000, self._flush
+            )
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.data_event.set()
+
+    def drain(self):
+        """Take everything buffered so far and reset the data event."""
+        # Swap rather than copy: consumers get the filled bytearray and
+        # the reader keeps appending into a fresh one
+        data = self.buffer
+        self.buffer = bytearray()
+        self.data_event.clear()
+        return data
+
+    def write_input(self, data):
+        self.hub.send_input(self.pane_id, data)
+
+    def exited(self):
+        return self._exited
+
+    def mark_exited(self):
+        self._exited = True
+        self._flush()
+
+    def resize(self, rows, cols):
+        """Record the newest size; the debounce timer applies the final one."""
+        self._pending_size = (rows, cols)
+        if self._resize_handle is None:
+            self._resize_handle = self._loop.call_later(
+                RESIZE_DEBOUNCE_MS / 1000, self._apply_pending_size
+            )
+
+    def _apply_pending_size(self):
+        self._resize_handle = None
+        rows, cols = self._pending_size
+        self.hub.resize_window(self.window_id, rows, cols)
+
+    def close(self):
+        # Flag first so handlers awaiting between lookup and use see it
+        self.closed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._resize_handle is not None:
+            self._resize_handle.cancel()
+            self._resize_handle = None
+        self.hub.forget(self)
+        if not self._exited:
+            self.hub.kill_window(self.window_id)
+
+
+class ControlModeHub:
+    """One ``tmux -C`` client multiplexing every session as a window.
+
+    Control mode frames all pane output as ``%output`` notifications on
+    a single pipe, so the server holds one subprocess and one readable
+    fd no matter how many terminals are open.
+    """
+    def __init__(self, env, session_name='_http_terminal_hub'):
+        self._env = env
+        self.session_name = session_name
+        self.process = None
+        self._reader_task = None
+        self._pending = deque()   # one future per command awaiting %end/%error
+        self._ready = False       # guard block before first command consumed?
+        self._by_pane = {}        # '%3' → ControlModeSession
+        self._by_window = {}      # '@2' → ControlModeSession
+        self._loop = asyncio.get_event_loop()
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            'tmux', '-C', 'new-session', '-A', '-s', self.session_name,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=self._env
+        )
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+        # Keep the hub alive when all terminal windows close
+        await self._command('set-option', '-t', self.session_name,
+                            'detach-on-destroy', 'off')
+
+    def _post(self, *args):
+        """Send one command line; returns a future for its reply block."""
+        fut = self._loop.create_future()
+        self._pending.append(fut)
+        line = ' '.join(shlex.quote(a) for a in args) + '\n'
+        self.process.stdin.write(line.encode())
+        return fut
+
+    async def _command(self, *args):
+        ok, lines = await self._post(*args)
+        if not ok:
+            raise RuntimeError(f"tmux command failed: {args}: {lines}")
+        return lines
+
+    async def create_session(self, sid):
+        lines = await self._command(
+            'new-window', '-t', self.session_name + ':', '-P', '-F',
+            '#{window_id} #{pane_id}'
+        )
+        window_id, pane_id = lines[0].split()
+        sess = ControlModeSession(self, sid, window_id, pane_id)
+        self._by_pane[pane_id] = sess
+        self._by_window[window_id] = sess
+        return sess
+
+    def send_input(self, pane_id, data):
+        # -H takes hex byte values, so arbitrary input needs no quoting
+        self._post('send-keys', '-t', pane_id, '-H',
+                   *[f'{b:02x}' for b in data])
+
+    def resize_window(self, window_id, rows, cols):
+        self._post('resize-window', '-t', window_id,
+                   '-x', str(cols), '-y', str(rows))
+
+    def kill_window(self, window_id):
+        self._post('kill-window', '-t', window_id)
+
+    def forget(self, sess):
+        self._by_pane.pop(sess.pane_id, None)
+        self._by_window.pop(sess.window_id, None)
+
+    async def _read_loop(self):
+        reply = None
+        while True:
+            raw = await self.process.stdout.readline()
+            if not raw:
+                break
+            line = raw.rstrip(b'\r\n')
+            if line.startswith(b'%begin'):
+                reply = []
+            elif line.startswith(b'%end') or line.startswith(b'%error'):
+                if not self._ready:
+                    # tmux emits one block on attach before any command
+                    self._ready = True
+                elif self._pending:
+                    fut = self._pending.popleft()
+                    if not fut.done():
+                        fut.set_result((line.startswith(b'%end'), reply or []))
+                reply = None
+            elif line.startswith(b'%output '):
+                _, pane, payload = line.split(b' ', 2)
+                sess = self._by_pane.get(pane.decode())
+                if sess is not None:
+                    sess.feed(_unescape_output(payload))
+            elif (line.startswith(b'%window-close')
+                    or line.startswith(b'%unlinked-window-close')):
+                parts = line.split()
+                sess = self._by_window.get(parts[1].decode())
+                if sess is not None:
+                    sess.mark_exited()
+            elif reply is not None and not line.startswith(b'%'):
+                reply.append(line.decode('utf-8', errors='ignore'))
+
+        # Hub died: every session is gone with it
+        for sess in list(self._by_pane.values()):
+            sess.mark_exited()
+        while self._pending:
+            fut = self._pending.popleft()
+            if not fut.done():
+                fut.set_result((False, []))
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.process is not None and self.process.returncode is None:
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                pass
+        subprocess.run(['tmux', 'kill-session', '-t', self.session_name],
+                       check=False)
+
+
 class TerminalServer:
-    def __init__(self):
+    def __init__(self, control_mode=False):
         self.app = web.Application()
-        self.sessions = {}  # session_id → TerminalSession
+        self.sessions = {}  # session_id → TerminalSession / ControlModeSession
+        self.sessions_lock = asyncio.Lock()
+        self.control_mode = control_mode
+        self.hub = None  # lazily-started ControlModeHub
         self.setup_routes()
 
     def setup_routes(self):
         self.app.router.add_get('/',                self.handle_index)
         self.app.router.add_get('/terminal',        self.handle_new)
+        self.app.router.add_get('/terminal/ws',     self.handle_ws)
         self.app.router.add_get('/terminal/output', self.handle_poll)
         self.app.router.add_post('/terminal/input',  self.handle_input)
         self.app.router.add_post('/terminal/resize', self.handle_resize)
@@ -132,81 +493,142 @@ class TerminalServer:
         sid = request.query.get('session_id')
         if not sid:
             raise web.HTTPBadRequest(text="Missing session_id")
-        if sid not in self.sessions:
-            self.sessions[sid] = TerminalSession(session_name=sid)
-            logger.info(f"🆕 Started tmux session '{sid}'")
-        return web.json_response({'status': 'ok'})
+        async with self.sessions_lock:
+            if sid not in self.sessions:
+                if self.control_mode:
+                    if self.hub is None:
+                        self.hub = ControlModeHub(_TMUX_ENV)
+                        await self.hub.start()
+                    self.sessions[sid] = await self.hub.create_session(sid)
+                else:
+                    self.sessions[sid] = TerminalSession(session_name=sid)
+                logger.info(f"🆕 Started tmux session '{sid}'")
+        return _json_response({'status': 'ok'})
 
     def _get_session(self, request):
         sid = request.query.get('session_id')
         if not sid or sid not in self.sessions:
             raise web.HTTPBadRequest(text="Invalid or missing session_id")
-        return sid, self.sessions[sid]
+        sess = self.sessions[sid]
+        if sess.closed:
+            raise web.HTTPGone(text="Session closed")
+        return sid, sess
+
+    async def _drop_session(self, sid, sess):
+        async with self.sessions_lock:
+            sess.close()
+            self.sessions.pop(sid, None)
+        logger.info(f"🗑️  Session '{sid}' closed and cleaned up")
 
     async def handle_input(self, request):
         _, sess = self._get_session(request)
-        data = await request.json()
+        data = orjson.loads(await request.read())
         buf = data.get('input', '').encode()
         if buf == b'\r': buf = b'\n'
-        os.write(sess.master, buf)
-        return web.json_response({'status': 'ok'})
+        sess.write_input(buf)
+        return _json_response({'status': 'ok'})
 
     async def handle_resize(self, request):
         _, sess = self._get_session(request)
-        data = await request.json()
+        data = orjson.loads(await request.read())
         sess.resize(int(data.get('rows', 24)), int(data.get('cols', 80)))
-        return web.json_response({'status': 'ok'})
+        return _json_response({'status': 'ok'})
+
+    async def handle_ws(self, request):
+        """Bidirectional terminal I/O over a single WebSocket.
+
+        PTY output is pushed as binary frames the moment it arrives;
+        input and resize arrive as JSON text frames. This avoids the
+        per-request HTTP overhead and tail latency of the polling
+        endpoints, which remain available as a fallback.
+        """
+        sid, sess = self._get_session(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def pump_output():
+            # Kernel-side splice() from the PTY into the socket is off
+            # the table here: WebSocket frames (and the chunked fallback
+            # response) need userland framing around every payload, so
+            # bytes must surface once. drain() hands the buffer over
+            # without copying, which is as close to zero-copy as the
+            # protocol allows.
+            while True:
+                await sess.data_event.wait()
+                data = sess.drain()
+                if data:
+                    await ws.send_bytes(data)
+                if sess.exited():
+                    break
+            await ws.close()
+
+        async def pump_input():
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                data = orjson.loads(msg.data)
+                if data.get('type') == 'input':
+                    buf = data.get('input', '').encode()
+                    if buf == b'\r': buf = b'\n'
+                    sess.write_input(buf)
+                elif data.get('type') == 'resize':
+                    sess.resize(int(data.get('rows', 24)), int(data.get('cols', 80)))
+
+        tasks = [asyncio.ensure_future(pump_output()),
+                 asyncio.ensure_future(pump_input())]
+        _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+        if sess.exited() and sid in self.sessions:
+            await self._drop_session(sid, sess)
+        return ws
 
     async def handle_poll(self, request):
-        """Poll for any available output, and flag closed if tmux client died."""
+        """Long-poll: wait for output and stream it back as raw PTY bytes.
+
+        The closed flag travels in the X-Session-Closed header, so the
+        body needs no UTF-8 decode and no JSON escaping.
+        """
         sid, sess = self._get_session(request)
-        output_parts = []
 
-        while True:
-            r, _, _ = select.select([sess.master], [], [], 0)
-            if not r:
-                break
-            chunk = os.read(sess.master, 4096)
-            if not chunk:
-                break
-            output_parts.append(chunk.decode('utf-8', errors='ignore'))
+        try:
+            await asyncio.wait_for(sess.data_event.wait(), timeout=POLL_WAIT_S)
+        except asyncio.TimeoutError:
+            pass
 
-        output = ''.join(output_parts)
-        closed = sess.process.poll() is not None
+        output = sess.drain()
+        closed = sess.exited()
 
         if closed:
-            # final non-blocking drain
-            while True:
-                r, _, _ = select.select([sess.master], [], [], 0)
-                if not r:
-                    break
-                try:
-                    chunk = os.read(sess.master, 4096)
-                except OSError:
-                    break
-                if not chunk:
-                    break
-                output += chunk.decode('utf-8', errors='ignore')
+            await self._drop_session(sid, sess)
 
-            sess.close()
-            del self.sessions[sid]
-            logger.info(f"🗑️  Session '{sid}' closed and cleaned up")
-
-        return web.json_response({
-            'output': output,
-            'closed': closed
+        response = web.StreamResponse(headers={
+            'Content-Type': 'application/octet-stream',
+            'X-Session-Closed': '1' if closed else '0',
         })
+        await response.prepare(request)
+        if output:
+            await response.write(output)
+        await response.write_eof()
+        return response
 
     async def cleanup(self):
-        for sid, sess in list(self.sessions.items()):
-            sess.close()
-            logger.info(f"🗑️  Closed session '{sid}' on shutdown")
-        self.sessions.clear()
+        async with self.sessions_lock:
+            for sid, sess in list(self.sessions.items()):
+                sess.close()
+                logger.info(f"🗑️  Closed session '{sid}' on shutdown")
+            self.sessions.clear()
+        if self.hub is not None:
+            await self.hub.stop()
+            self.hub = None
 
 
 async def main():
-    server = TerminalServer()
-    runner = web.AppRunner(server.app)
+    server = TerminalServer(control_mode=getattr(args, 'control_mode', False))
+    # Outlive the long-poll window so fallback clients reuse one TCP
+    # connection across consecutive polls instead of reconnecting
+    runner = web.AppRunner(server.app, keepalive_timeout=POLL_WAIT_S + 50)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', 8866)
     await site.start()
@@ -221,4 +643,9 @@ async def main():
 
 
 if __name__ == '__main__':
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -27,7 +27,11 @@ setup(
             'httpterminal = jupyter_http_terminal.server:setup_jupyter_server_proxy',
         ]
     },
-    install_requires=['jupyter-server-proxy>=1.4.0'],
+    install_requires=[
+        'jupyter-server-proxy>=1.4.0',
+        'orjson',
+        'uvloop; platform_system != "Windows"',
+    ],
     include_package_data=True,
     keywords=["Interactive", "Desktop", "Jupyter"],
     license="BSD",